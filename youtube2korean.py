@@ -5,50 +5,180 @@ YouTube 영어 영상을 한국어 음성으로 변환하는 스크립트
 """
 
 import os
+import asyncio
 import sys
 import argparse
+import hashlib
+import io
+import json
+import random
+import re
+import shelve
+import socket
+import socketserver
+import subprocess
 import tempfile
+import threading
+import time
 from pathlib import Path
 from typing import Optional
+import ctranslate2
+import numpy as np
+import requests
 import yt_dlp
-import whisper
+from faster_whisper import BatchedInferencePipeline, WhisperModel
 import ollama
-from gtts import gTTS
+from gtts import gTTS, gTTSError
 from tqdm import tqdm
 import logging
 
+try:
+    from piper import PiperVoice  # 선택 사항: 로컬 ONNX TTS
+except ImportError:
+    PiperVoice = None
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# llama.cpp 서버 요청용 HTTP 세션 (keep-alive로 연결 재사용)
+_http_session = requests.Session()
+
+# 모든 번역 요청에 동일하게 들어가는 프롬프트 접두사
+TRANSLATION_SYSTEM_PROMPT = (
+    "당신은 영어-한국어 번역가입니다. 주어진 영어 텍스트를 자연스러운 한국어로 "
+    "간결하고 정확하게 번역하세요. 번역문만 출력하세요. "
+    "입력이 [1], [2]처럼 번호가 매겨진 구간들이면 각 구간을 따로 번역하고 "
+    "같은 번호를 붙여 [1] 번역문 [2] 번역문 형식으로 출력하세요."
+)
+
+# 한 번의 Ollama 요청에 묶어 보내는 청크 수
+TRANSLATION_GROUP_SIZE = 4
+
+# 번역 품질별 Gemma 3:4B 양자화 버전
+# - fast: Q4_K_M, Q8_0 대비 디코딩 속도 약 2배, 메모리 절반
+# - accurate: Q8_0, 원본(FP16)과 거의 같은 번역 품질
+OLLAMA_MODELS = {
+    'fast': "gemma3:4b-it-q4_K_M",
+    'accurate': "gemma3:4b-it-q8_0",
+}
+
+# 모델 로드 옵션 (요청마다 값이 달라지면 Ollama가 모델을 다시 로드함)
+# num_ctx는 고정값이며, 생성 토큰 상한은 여기서 프롬프트 길이를 뺀 나머지로 정함
+OLLAMA_LOAD_OPTIONS = {
+    'num_ctx': 3072,
+    'num_batch': 512,
+    'num_gpu': 999,      # 가능한 모든 레이어를 GPU에 올림
+}
+
+# 파이프라인 전체 실행 동안 모델이 메모리에 상주하도록 유지하는 시간
+OLLAMA_KEEP_ALIVE = '30m'
+
+# gTTS 청크 동시 합성 스레드 수
+TTS_MAX_WORKERS = 8
+
 class YouTube2Korean:
-    def __init__(self, output_dir: str = "output"):
+    def __init__(self, output_dir: str = "output", batch_size: int = 16, max_concurrent: int = 4,
+                 quality: str = "fast", piper_voice: Optional[str] = None, device: str = "auto",
+                 llama_server: Optional[str] = None):
         self.output_dir = Path(output_dir)
-        self.audio_dir = Path("audio")
+        self.batch_size = batch_size
+        self.max_concurrent = max_concurrent  # OLLAMA_NUM_PARALLEL과 맞추는 것을 권장
+        self.quality = quality
+        self.llama_server = llama_server.rstrip('/') if llama_server else None
         self.text_dir = Path("text")
         
         # 디렉토리 생성
-        for dir_path in [self.output_dir, self.audio_dir, self.text_dir]:
+        for dir_path in [self.output_dir, self.text_dir]:
             dir_path.mkdir(exist_ok=True)
         
-        # Whisper 모델 로드
-        logger.info("Whisper 모델 로딩 중...")
-        self.whisper_model = whisper.load_model("base")
+        # 번역 결과 캐시 (실행 간 유지, 번역 스레드들이 공유하므로 잠금 사용)
+        try:
+            self._translation_cache = shelve.open(str(self.text_dir / ".trans_cache.db"))
+        except Exception as e:
+            # 다른 프로세스가 캐시 파일을 잠그고 있으면 이번 실행에서만 메모리 캐시 사용
+            logger.warning(f"번역 캐시 파일을 열 수 없어 메모리 캐시를 사용합니다: {e}")
+            self._translation_cache = {}
+        self._cache_lock = threading.Lock()
+        
+        # Whisper 모델 로드 (CUDA가 있으면 GPU FP16, 없으면 CPU int8 양자화)
+        if device == "auto":
+            device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        compute_type = "float16" if device == "cuda" else "int8"
+        logger.info(f"Whisper 모델 로딩 중... ({device}, {compute_type})")
+        self.whisper_model = WhisperModel("base", device=device, compute_type=compute_type)
+        # VAD 구간 단위 배치 디코딩 파이프라인
+        self.batched_model = BatchedInferencePipeline(model=self.whisper_model)
         
-        # Ollama 번역 모델 초기화 (Gemma 3:4B 사용)
-        self._setup_ollama_model()
+        # 번역 모델 초기화 (llama.cpp 서버 또는 양자화된 Gemma 3:4B Ollama 모델)
+        self.ollama_model = None
+        self.llama_model = None  # llama.cpp 서버가 보고한 모델 ID
+        if self.llama_server:
+            self._setup_llama_server()
+        else:
+            self._setup_ollama_model()
+        
+        # Piper TTS 음성 모델 로드 (없으면 gTTS 사용)
+        self.piper_voice = self._load_piper_voice(piper_voice) if piper_voice else None
+    
+    @property
+    def translation_enabled(self) -> bool:
+        """번역 백엔드(llama.cpp 서버 또는 Ollama) 사용 가능 여부"""
+        return self.llama_server is not None or self.ollama_model is not None
+    
+    def _setup_llama_server(self):
+        """llama.cpp 서버(llama-server) 연결 확인 및 system 프롬프트 접두사 워밍업"""
+        logger.info(f"llama.cpp 서버 연결 확인 중: {self.llama_server}")
+        
+        try:
+            _http_session.get(f"{self.llama_server}/health", timeout=5).raise_for_status()
+            models = _http_session.get(f"{self.llama_server}/v1/models", timeout=5)
+            models.raise_for_status()
+            self.llama_model = models.json()['data'][0]['id']
+            self._chat(
+                [{'role': 'system', 'content': TRANSLATION_SYSTEM_PROMPT},
+                 {'role': 'user', 'content': 'Hello.'}],
+                num_predict=1, check_length=False
+            )
+            logger.info(f"llama.cpp 번역 서버 준비 완료: {self.llama_model}")
+            
+        except Exception as e:
+            logger.error(f"llama.cpp 서버 연결 실패: {e}")
+            logger.info("번역 기능을 건너뛰고 원본 텍스트를 사용합니다.")
+            self.llama_server = None
+    
+    def _load_piper_voice(self, voice_path: str):
+        """Piper ONNX 음성 모델 로드"""
+        if PiperVoice is None:
+            logger.warning("piper-tts가 설치되어 있지 않아 gTTS를 사용합니다.")
+            return None
+        
+        try:
+            logger.info(f"Piper 음성 모델 로딩 중: {voice_path}")
+            return PiperVoice.load(voice_path)
+        except Exception as e:
+            logger.error(f"Piper 음성 모델 로딩 실패: {e}")
+            logger.info("gTTS를 대신 사용합니다.")
+            return None
     
     def _setup_ollama_model(self):
-        """Ollama 번역 모델 설정 - Gemma 3:4B 사용"""
+        """Ollama 번역 모델 설정 - 품질 옵션에 맞는 Gemma 3:4B 양자화 버전 사용"""
         logger.info("Ollama 연결 확인 중...")
         
-        self.ollama_model = "gemma3:4b"  # Gemma 모델 사용
+        self.ollama_model = OLLAMA_MODELS[self.quality]  # Gemma 모델 사용
         
         try:
             # Ollama 서비스 확인
             models = ollama.list()
-            print('===models',models)
             available_models = [model['model'] for model in models['models']]
-            print("available_models",available_models)
+            logger.debug("available models: %s", available_models)
+            if self.ollama_model not in available_models:
+                try:
+                    logger.info(f"모델 {self.ollama_model} 다운로드 중...")
+                    ollama.pull(self.ollama_model)
+                    available_models.append(self.ollama_model)
+                except Exception as e:
+                    logger.warning(f"모델 다운로드 실패: {e}")
+            
             if self.ollama_model not in available_models:
                 logger.warning(f"모델 {self.ollama_model}을 찾을 수 없습니다.")
                 logger.info(f"사용 가능한 모델: {available_models}")
@@ -63,248 +193,652 @@ class YouTube2Korean:
                     return
             
             logger.info(f"Ollama 번역 모델 준비 완료: {self.ollama_model}")
+            self._preload_ollama()
             
         except Exception as e:
             logger.error(f"Ollama 연결 실패: {e}")
             logger.info("번역 기능을 건너뛰고 원본 텍스트를 사용합니다.")
             self.ollama_model = None
     
-    def extract_audio(self, youtube_url: str) -> Optional[str]:
-        """YouTube에서 오디오 추출"""
-        logger.info(f"YouTube 오디오 추출 시작: {youtube_url}")
+    def _preload_ollama(self):
+        """모델을 메모리에 미리 올리고 system 프롬프트 접두사로 KV 캐시를 채워둠
+        
+        첫 번째 번역 청크가 모델 로딩 시간을 기다리지 않도록 1토큰만 생성한다.
+        """
+        logger.info(f"Ollama 모델 미리 로딩 중: {self.ollama_model}")
+        try:
+            ollama.chat(
+                model=self.ollama_model,
+                messages=[
+                    {'role': 'system', 'content': TRANSLATION_SYSTEM_PROMPT},
+                    {'role': 'user', 'content': 'Hello.'},
+                ],
+                options={'num_predict': 1, **OLLAMA_LOAD_OPTIONS},
+                keep_alive=OLLAMA_KEEP_ALIVE
+            )
+        except Exception as e:
+            logger.warning(f"Ollama 모델 미리 로딩 실패: {e}")
+    
+    def extract_audio(self, youtube_url: str) -> Optional[np.ndarray]:
+        """YouTube에서 오디오 추출
         
-        # 임시 파일명 생성
-        temp_file = self.audio_dir / "temp_audio"
+        오디오 스트림 URL만 받아 ffmpeg로 16kHz 모노 float32 PCM을 바로 디코딩하므로
+        디스크에 WAV 파일을 쓰고 다시 읽는 과정이 없다.
+        """
+        logger.info(f"YouTube 오디오 추출 시작: {youtube_url}")
         
         ydl_opts = {
             'format': 'bestaudio/best',
-            'outtmpl': str(temp_file) + '.%(ext)s',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'wav',
-                'preferredquality': '192',
-            }],
+            'quiet': True,
         }
         
         try:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([youtube_url])
+                info = ydl.extract_info(youtube_url, download=False)
             
-            # 추출된 파일 찾기
-            audio_file = temp_file.with_suffix('.wav')
-            if audio_file.exists():
-                logger.info(f"오디오 추출 완료: {audio_file}")
-                return str(audio_file)
-            else:
-                logger.error("오디오 파일을 찾을 수 없습니다.")
+            # YouTube가 요구하는 요청 헤더를 ffmpeg에도 전달
+            headers = "".join(f"{k}: {v}\r\n" for k, v in info.get('http_headers', {}).items())
+            cmd = ['ffmpeg', '-loglevel', 'error']
+            if headers:
+                cmd += ['-headers', headers]
+            # Whisper 입력 형식(16kHz 모노 float32)으로 바로 디코딩
+            cmd += ['-i', info['url'], '-f', 'f32le', '-ar', '16000', '-ac', '1', '-']
+            
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, check=True)
+            audio = np.frombuffer(result.stdout, dtype=np.float32)
+            
+            if audio.size == 0:
+                logger.error("추출된 오디오가 비어 있습니다.")
                 return None
+            
+            logger.info(f"오디오 추출 완료: {audio.size / 16000:.1f}초")
+            return audio
                 
         except Exception as e:
             logger.error(f"오디오 추출 실패: {e}")
             return None
     
-    def transcribe_audio(self, audio_file: str) -> Optional[str]:
-        """오디오를 텍스트로 변환 (STT)"""
-        logger.info("음성 인식 시작...")
+    def _transcribe_segments(self, audio):
+        """16kHz 모노 float32 오디오에서 인식된 세그먼트를 디코딩되는 대로 내보내는 제너레이터"""
+        # VAD로 나눈 구간들을 배치로 묶어 병렬 디코딩
+        segments, info = self.batched_model.transcribe(
+            audio, batch_size=self.batch_size, language="en", vad_filter=True
+        )
+        return segments
+    
+    def _translate_group(self, start: int, group: list, total: Optional[int] = None) -> list:
+        """여러 청크를 번호 구분자로 묶어 한 번의 요청으로 번역 (캐시에 있는 청크는 제외)"""
+        translated = [self._get_cached_translation(chunk) for chunk in group]
+        missing = [j for j, korean in enumerate(translated) if korean is None]
+        if len(missing) < len(group):
+            logger.info(f"청크 {start+1}-{start+len(group)} 중 {len(group) - len(missing)}개 캐시 사용")
         
-        try:
-            result = self.whisper_model.transcribe(audio_file, language="en")
-            text = result["text"].strip()
-            
-            # 텍스트 파일로 저장
-            text_file = self.text_dir / "transcribed_text.txt"
-            with open(text_file, 'w', encoding='utf-8') as f:
-                f.write(text)
-            
-            logger.info(f"음성 인식 완료. 텍스트 길이: {len(text)} 문자")
-            logger.info(f"텍스트 저장됨: {text_file}")
-            
-            return text
+        if len(missing) == 1:
+            j = missing[0]
+            translated[j] = self._translate_chunk(start + j, group[j], total)
+        elif missing:
+            label = f"청크 {start+1}-{start+len(group)}" + (f"/{total}" if total else "")
+            content = "\n".join(f"[{n}] {group[j]}" for n, j in enumerate(missing, 1))
+            response = self._request_translation(content, label)
             
-        except Exception as e:
-            logger.error(f"음성 인식 실패: {e}")
+            parsed = self._parse_numbered(response, len(missing)) if response else None
+            if parsed is None:
+                # 구분자 파싱 실패 시 청크별 개별 요청으로 대체
+                logger.warning(f"{label} 묶음 번역 결과 파싱 실패, 청크별로 다시 번역합니다.")
+                for j in missing:
+                    translated[j] = self._translate_chunk(start + j, group[j], total)
+            else:
+                for j, korean in zip(missing, parsed):
+                    translated[j] = korean
+                    self._cache_translation(group[j], korean)
+        
+        return translated
+    
+    def _cache_key(self, chunk: str) -> str:
+        """번역 모델 ID와 정규화한 청크(소문자, 공백 정리)로 만든 캐시 키"""
+        normalized = " ".join(chunk.lower().split())
+        backend = f"llama.cpp:{self.llama_model}" if self.llama_server else self.ollama_model
+        return hashlib.sha1(f"{backend}\0{normalized}".encode('utf-8')).hexdigest()
+    
+    def _get_cached_translation(self, chunk: str) -> Optional[str]:
+        with self._cache_lock:
+            return self._translation_cache.get(self._cache_key(chunk))
+    
+    def _cache_translation(self, chunk: str, korean: str):
+        """정상 종료된 비어 있지 않은 번역만 캐시 (잘못된 결과가 다음 실행까지 남지 않도록)"""
+        if not korean.strip():
+            return
+        with self._cache_lock:
+            self._translation_cache[self._cache_key(chunk)] = korean
+    
+    def _sync_translation_cache(self):
+        """캐시를 디스크에 기록 (메모리 캐시로 대체된 경우 무시)"""
+        if isinstance(self._translation_cache, shelve.Shelf):
+            with self._cache_lock:
+                self._translation_cache.sync()
+    
+    @staticmethod
+    def _parse_numbered(text: str, count: int) -> Optional[list]:
+        """'[1] ... [2] ...' 형식의 응답을 구간별로 분리 (개수가 맞지 않으면 None)"""
+        parts = re.split(r"\[(\d+)\]", text)
+        numbers = [int(n) for n in parts[1::2]]
+        if numbers != list(range(1, count + 1)):
             return None
+        
+        segments = [segment.strip() for segment in parts[2::2]]
+        if not all(segments):
+            return None
+        return segments
     
-    def translate_text(self, english_text: str) -> Optional[str]:
-        """영어 텍스트를 한국어로 번역 (Ollama 사용)"""
-        logger.info("Ollama를 사용한 번역 시작...")
+    def _translate_chunk(self, i: int, chunk: str, total: Optional[int] = None) -> str:
+        """단일 청크 번역 (최종 실패 시 원본 반환)"""
+        translated = self._request_translation(chunk, f"청크 {i+1}" + (f"/{total}" if total else ""))
+        if translated is None:
+            logger.error(f"청크 {i+1} 번역 최종 실패, 원본 텍스트 사용")
+            return chunk  # 원본 텍스트 사용
+        self._cache_translation(chunk, translated)
+        return translated
+    
+    def _request_translation(self, content: str, label: str) -> Optional[str]:
+        """번역 요청 (재시도 포함, 최종 실패 시 None)"""
+        # 생성 토큰 상한을 입력 길이에 비례하게 잡아 불필요한 디코딩 예산을 줄이되,
+        # 컨텍스트에서 프롬프트(system 프롬프트는 글자당 1토큰, 영어는 3글자당 1토큰,
+        # 채팅 템플릿 여유분)를 뺀 나머지를 넘지 않게 함. 한국어 출력은 입력의 약 3배로 추정
+        estimated_tokens = len(content) // 3
+        prompt_tokens = len(TRANSLATION_SYSTEM_PROMPT) + estimated_tokens + 32
+        remaining_tokens = OLLAMA_LOAD_OPTIONS['num_ctx'] - prompt_tokens
+        num_predict = max(min(estimated_tokens * 3, remaining_tokens), 64)
+        max_retries = 3
+        retry_count = 0
         
-        try:
-            if self.ollama_model is None:
-                logger.warning("Ollama 모델이 없어 원본 텍스트를 반환합니다.")
-                return english_text
-            
-            # 텍스트를 청크 단위로 분할 (안정성을 위해 더 작은 청크 사용)
-            chunks = self._split_text(english_text, max_length=500)
-            translated_chunks = []
-            
-            for i, chunk in enumerate(tqdm(chunks, desc="Ollama 번역 진행")):
-                max_retries = 3
-                retry_count = 0
-                translated = None
+        while retry_count < max_retries:
+            try:
+                logger.info(f"{label} 번역 중... (시도: {retry_count+1})")
                 
-                while retry_count < max_retries and translated is None:
-                    try:
-                        logger.info(f"청크 {i+1}/{len(chunks)} 번역 중... (시도: {retry_count+1})")
-                        
-                        # Ollama를 사용한 번역
-                        prompt = f"""다음 영어 텍스트를 자연스러운 한국어로 번역해주세요. 간결하고 정확하게 번역해주세요.
-
-영어: {chunk}
-
-한국어:"""
-
-                        response = ollama.chat(
-                            model=self.ollama_model,
-                            messages=[{
-                                'role': 'user',
-                                'content': prompt
-                            }],
-                            options={
-                                'temperature': 0.2,  # 더 일관성 있는 번역
-                                'top_p': 0.8,
-                                'num_predict': 1024,  # 토큰 수 줄임
-                                'num_ctx': 2048      # 컨텍스트 줄임
-                            },
-                            keep_alive='10m'
-                        )
-                        
-                        translated = response['message']['content'].strip()
-                        logger.info(f"청크 {i+1} 번역 완료")
-                        break
-                        
-                    except Exception as e:
-                        retry_count += 1
-                        logger.warning(f"청크 {i+1} 번역 실패 (시도 {retry_count}/{max_retries}): {e}")
-                        if retry_count < max_retries:
-                            import time
-                            time.sleep(2)  # 2초 대기 후 재시도
+                # 고정 system 프롬프트는 KV 캐시 재사용
+                translated = self._chat([
+                    {'role': 'system', 'content': TRANSLATION_SYSTEM_PROMPT},
+                    {'role': 'user', 'content': content},
+                ], num_predict=num_predict)
+                if not translated:
+                    raise RuntimeError("빈 번역 응답을 받았습니다.")
+                logger.info(f"{label} 번역 완료")
+                return translated
                 
-                if translated is not None:
-                    translated_chunks.append(translated)
-                else:
-                    logger.error(f"청크 {i+1} 번역 최종 실패, 원본 텍스트 사용")
-                    translated_chunks.append(chunk)  # 원본 텍스트 사용
-            
-            korean_text = " ".join(translated_chunks)
-            
-            # 번역된 텍스트 저장
-            korean_file = self.text_dir / "translated_text.txt"
-            with open(korean_file, 'w', encoding='utf-8') as f:
-                f.write(korean_text)
-            
-            logger.info(f"번역 완료. 한국어 텍스트 길이: {len(korean_text)} 문자")
-            logger.info(f"번역 텍스트 저장됨: {korean_file}")
-            
-            return korean_text
-            
-        except Exception as e:
-            logger.error(f"번역 실패: {e}")
-            return None
+            except Exception as e:
+                retry_count += 1
+                logger.warning(f"{label} 번역 실패 (시도 {retry_count}/{max_retries}): {e}")
+                if retry_count < max_retries:
+                    # 지수 백오프 + 지터 (동시 요청들이 한꺼번에 재시도하지 않도록)
+                    delay = min(0.5 * 2 ** retry_count + random.uniform(0, 0.25), 8.0)
+                    time.sleep(delay)
+        
+        return None
+    
+    def _chat(self, messages: list, num_predict: int, check_length: bool = True) -> str:
+        """설정된 백엔드(llama.cpp 서버 또는 Ollama)로 채팅 요청을 보내고 응답 본문 반환
+        
+        check_length가 참이면 생성 토큰 상한에 걸려 잘린 응답은 RuntimeError로 처리한다.
+        """
+        if self.llama_server:
+            # llama-server의 연속 배칭이 동시 요청들을 함께 처리함
+            response = _http_session.post(
+                f"{self.llama_server}/v1/chat/completions",
+                json={
+                    'messages': messages,
+                    'temperature': 0.2,
+                    'top_p': 0.8,
+                    'max_tokens': num_predict,
+                    'cache_prompt': True,  # 공통 접두사 KV 캐시 재사용
+                },
+                timeout=600
+            )
+            response.raise_for_status()
+            choice = response.json()['choices'][0]
+            if check_length and choice.get('finish_reason') == 'length':
+                raise RuntimeError(f"응답이 생성 토큰 상한({num_predict})에서 잘렸습니다.")
+            return choice['message']['content'].strip()
+        
+        response = ollama.chat(
+            model=self.ollama_model,
+            messages=messages,
+            options={
+                'temperature': 0.2,  # 더 일관성 있는 번역
+                'top_p': 0.8,
+                'num_predict': num_predict,
+                **OLLAMA_LOAD_OPTIONS
+            },
+            keep_alive=OLLAMA_KEEP_ALIVE
+        )
+        if check_length and response.get('done_reason') == 'length':
+            raise RuntimeError(f"응답이 생성 토큰 상한({num_predict})에서 잘렸습니다.")
+        return response['message']['content'].strip()
     
     def _split_text(self, text: str, max_length: int = 1000) -> list:
-        """텍스트를 적절한 크기로 분할"""
-        sentences = text.replace('\n', ' ').split('. ')
+        """텍스트를 적절한 크기로 분할
+        
+        '. ' 문장 경계를 str.find로 한 번만 훑으면서 원본 문자열을 슬라이스하므로
+        문자열 이어붙이기 없이 O(n)으로 동작한다.
+        """
+        text = text.replace('\n', ' ')
         chunks = []
-        current_chunk = ""
+        start = 0  # 현재 청크 시작 위치
+        boundary = 0  # 현재 청크에 포함된 마지막 문장의 끝 위치
+        pos = 0
         
-        for sentence in sentences:
-            if len(current_chunk + sentence) < max_length:
-                current_chunk += sentence + ". "
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence + ". "
+        while True:
+            end = text.find('. ', pos)
+            sentence_end = len(text) if end == -1 else end + 1  # 마침표 포함
+            
+            if sentence_end - start >= max_length and boundary > start:
+                chunk = text[start:boundary].strip()
+                if chunk:
+                    chunks.append(chunk)
+                start = boundary
+            boundary = sentence_end
+            
+            if end == -1:
+                break
+            pos = end + 2
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        chunk = text[start:].strip()
+        if chunk:
+            chunks.append(chunk)
         
         return chunks
     
-    def text_to_speech(self, korean_text: str, output_filename: str = "korean_audio.mp3") -> Optional[str]:
-        """한국어 텍스트를 음성으로 변환 (TTS)"""
-        logger.info("TTS 변환 시작...")
+    @staticmethod
+    def _cut_long_text(text: str, max_length: int) -> list:
+        """max_length보다 긴 텍스트를 마지막 '? '/'! ' 또는 공백 위치에서 잘라 나눔"""
+        pieces = []
+        while len(text) > max_length:
+            window = text[:max_length]
+            cut = max(window.rfind('? '), window.rfind('! '))
+            cut = cut + 1 if cut > 0 else window.rfind(' ')
+            if cut <= 0:
+                cut = max_length  # 공백도 없으면 길이에서 자름
+            pieces.append(text[:cut].strip())
+            text = text[cut:].strip()
+        if text:
+            pieces.append(text)
+        return pieces
+    
+    def _synthesize_chunk(self, i: int, chunk: str) -> bytes:
+        """gTTS로 청크 하나를 MP3 바이트로 합성 (요청 제한(429) 등 실패 시 지수 백오프 재시도)"""
+        max_retries = 4
         
-        try:
-            # 텍스트를 청크로 분할 (gTTS 길이 제한)
-            chunks = self._split_text(korean_text, max_length=500)
+        for retry_count in range(max_retries):
+            try:
+                buffer = io.BytesIO()
+                gTTS(text=chunk, lang='ko', slow=False).write_to_fp(buffer)
+                return buffer.getvalue()
+            except gTTSError as e:
+                if retry_count == max_retries - 1:
+                    raise
+                logger.warning(f"TTS 청크 {i+1} 실패 (시도 {retry_count+1}/{max_retries}): {e}")
+                time.sleep(2 ** retry_count)  # 1, 2, 4초 대기 후 재시도
+    
+    def _piper_to_speech(self, korean_text: str) -> bytes:
+        """Piper로 텍스트를 로컬에서 합성해 ffmpeg로 MP3 바이트 인코딩
+        
+        합성되는 PCM을 별도 스레드에서 ffmpeg 표준 입력으로 바로 흘려보내고 인코딩된
+        MP3는 표준 출력에서 읽으므로, 전체 PCM을 메모리에 모으거나 중간 WAV 파일을
+        만들지 않는다. ID3/Xing 헤더를 쓰지 않으므로 청크별 결과를 그대로 이어붙일 수 있다.
+        """
+        sample_rate = self.piper_voice.config.sample_rate
+        ffmpeg = subprocess.Popen(
+            ['ffmpeg', '-loglevel', 'error',
+             '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', '-',
+             '-f', 'mp3', '-id3v2_version', '0', '-write_xing', '0', '-'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        errors = []
+        
+        def _feed_pcm():
+            try:
+                for audio_bytes in self.piper_voice.synthesize_stream_raw(korean_text):
+                    ffmpeg.stdin.write(audio_bytes)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                ffmpeg.stdin.close()
+        
+        feeder = threading.Thread(target=_feed_pcm, daemon=True)
+        feeder.start()
+        mp3 = ffmpeg.stdout.read()
+        feeder.join()
+        ffmpeg.wait()
+        
+        if ffmpeg.returncode != 0:
+            raise RuntimeError(f"ffmpeg 인코딩 실패 (코드 {ffmpeg.returncode})")
+        if errors:
+            raise errors[0]
+        return mp3
+    
+    def _speak_chunk(self, i: int, korean_text: str) -> bytes:
+        """번역된 청크 하나를 MP3 바이트로 합성"""
+        if self.piper_voice is not None:
+            return self._piper_to_speech(korean_text)
+        return self._synthesize_chunk(i, korean_text)
+    
+    async def _run_pipeline(self, audio: np.ndarray, output_path: Path) -> Optional[str]:
+        """음성 인식 → 번역 → TTS를 청크 단위로 겹쳐서 실행
+        
+        Whisper가 내보내는 세그먼트를 문장 경계 청크로 묶어 바로 번역 큐에 넣고,
+        번역이 끝난 청크는 TTS 큐로 넘겨 합성한다. 전체 소요 시간이 단계별 시간의
+        합이 아니라 가장 느린 단계에 가까워진다.
+        """
+        loop = asyncio.get_running_loop()
+        text_queue = asyncio.Queue()    # (인덱스, 영어 청크), 종료 시 None
+        speech_queue = asyncio.Queue()  # (인덱스, 한국어 청크), 종료 시 None
+        english_chunks = []
+        korean_chunks = {}
+        
+        # 단계별 진행 상황 (번역/TTS 전체 청크 수는 음성 인식이 끝나야 확정됨)
+        stt_progress = tqdm(total=round(audio.size / 16000, 1), unit="초", desc="음성 인식 진행")
+        translate_progress = tqdm(unit="청크", desc="번역 진행")
+        tts_progress = tqdm(unit="청크", desc="TTS 진행")
+        
+        # 중단 또는 다른 단계 실패 시 음성 인식 스레드를 멈추는 신호
+        stop_event = threading.Event()
+        
+        def _put_text(item):
+            loop.call_soon_threadsafe(text_queue.put_nowait, item)
+        
+        def _report_failure(queue: asyncio.Queue):
+            # 청크 작업이 실패하면 예외를 해당 단계의 큐에 넣어 단계 루프가 바로 중단되게 함
+            def _callback(task: asyncio.Task):
+                if not task.cancelled() and task.exception() is not None:
+                    queue.put_nowait(task.exception())
+            return _callback
+        
+        def _transcribe_stage():
+            # 워커 스레드에서 실행: 완성된 청크만 내보내고 마지막 조각은 버퍼에 남김
+            buffer = ""
+            try:
+                for segment in self._transcribe_segments(audio):
+                    if stop_event.is_set():
+                        break
+                    stt_progress.update(round(segment.end - stt_progress.n, 1))
+                    chunks = self._split_text(buffer + segment.text, max_length=500)
+                    buffer = chunks.pop() if chunks else ""
+                    # '. ' 경계가 없는 텍스트도 버퍼가 max_length를 넘지 않도록 강제로 자름
+                    chunks = [piece for chunk in chunks for piece in self._cut_long_text(chunk, 500)]
+                    if len(buffer) > 500:
+                        *forced, buffer = self._cut_long_text(buffer, 500)
+                        chunks += forced
+                    for chunk in chunks:
+                        _put_text((len(english_chunks), chunk))
+                        english_chunks.append(chunk)
+                if buffer:
+                    _put_text((len(english_chunks), buffer))
+                    english_chunks.append(buffer)
+                stt_progress.update(round(stt_progress.total - stt_progress.n, 1))
+                for progress in (translate_progress, tts_progress):
+                    progress.total = len(english_chunks)
+                    progress.refresh()
+            finally:
+                _put_text(None)
+        
+        async def _translate_stage():
+            semaphore = asyncio.Semaphore(self.max_concurrent)
+            tasks = []
             
-            if len(chunks) == 1:
-                # 단일 파일 생성
-                tts = gTTS(text=korean_text, lang='ko', slow=False)
-                output_path = self.output_dir / output_filename
-                tts.save(str(output_path))
-                logger.info(f"TTS 완료: {output_path}")
-                return str(output_path)
-            else:
-                # 여러 청크를 개별 파일로 저장
-                audio_files = []
-                for i, chunk in enumerate(tqdm(chunks, desc="TTS 진행")):
-                    tts = gTTS(text=chunk, lang='ko', slow=False)
-                    chunk_file = self.output_dir / f"chunk_{i:03d}.mp3"
-                    tts.save(str(chunk_file))
-                    audio_files.append(str(chunk_file))
+            async def _translate_one(start: int, group: list):
+                try:
+                    if not self.translation_enabled:
+                        translated = group  # 번역 모델이 없으면 원본 텍스트 사용
+                    else:
+                        translated = await asyncio.to_thread(self._translate_group, start, group)
+                    translate_progress.update(len(group))
+                    for j, korean in enumerate(translated):
+                        await speech_queue.put((start + j, korean))
+                finally:
+                    semaphore.release()
+            
+            while True:
+                # 슬롯이 빌 때까지 기다리는 동안 쌓인 청크는 한 요청으로 묶음
+                await semaphore.acquire()
+                items = [await text_queue.get()]
+                while len(items) < TRANSLATION_GROUP_SIZE and not text_queue.empty():
+                    items.append(text_queue.get_nowait())
                 
-                logger.info(f"TTS 완료: {len(audio_files)}개 파일 생성")
-                return audio_files[0]  # 첫 번째 파일 경로 반환
+                failures = [item for item in items if isinstance(item, BaseException)]
+                if failures:
+                    raise failures[0]
                 
-        except Exception as e:
-            logger.error(f"TTS 변환 실패: {e}")
+                finished = items[-1] is None
+                items = [item for item in items if item is not None]
+                if items:
+                    task = asyncio.create_task(
+                        _translate_one(items[0][0], [chunk for _, chunk in items])
+                    )
+                    task.add_done_callback(_report_failure(text_queue))
+                    tasks.append(task)
+                else:
+                    semaphore.release()
+                if finished:
+                    break
+            
+            await asyncio.gather(*tasks)
+            await speech_queue.put(None)
+        
+        async def _speech_stage():
+            semaphore = asyncio.Semaphore(1 if self.piper_voice is not None else TTS_MAX_WORKERS)
+            tasks = []
+            
+            async def _speak_one(i: int, korean: str):
+                async with semaphore:
+                    speech = await asyncio.to_thread(self._speak_chunk, i, korean)
+                tts_progress.update(1)
+                return i, speech
+            
+            while (item := await speech_queue.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                i, korean = item
+                korean_chunks[i] = korean
+                if korean.strip():
+                    task = asyncio.create_task(_speak_one(i, korean))
+                    task.add_done_callback(_report_failure(speech_queue))
+                    tasks.append(task)
+                else:
+                    tts_progress.update(1)
+            
+            return [speech for _, speech in sorted(await asyncio.gather(*tasks))]
+        
+        translate_task = asyncio.create_task(_translate_stage())
+        speech_task = asyncio.create_task(_speech_stage())
+        try:
+            _, _, audio_parts = await asyncio.gather(
+                asyncio.to_thread(_transcribe_stage), translate_task, speech_task
+            )
+        except BaseException:
+            # Ctrl-C나 단계 실패 시 남은 단계를 바로 멈춰 Whisper가 끝까지 도는 것을 막음
+            stop_event.set()
+            for task in (translate_task, speech_task):
+                task.cancel()
+            raise
+        finally:
+            for progress in (stt_progress, translate_progress, tts_progress):
+                progress.close()
+        self._sync_translation_cache()
+        
+        if not audio_parts:
+            logger.error("음성 인식 결과가 비어 있습니다.")
             return None
+        
+        # 인식/번역된 텍스트 저장
+        english_text = " ".join(english_chunks)
+        korean_text = " ".join(korean_chunks[i] for i in sorted(korean_chunks))
+        for filename, text in [("transcribed_text.txt", english_text),
+                               ("translated_text.txt", korean_text)]:
+            (self.text_dir / filename).write_text(text, encoding='utf-8')
+        logger.info(f"음성 인식 텍스트 길이: {len(english_text)} 문자, 번역 텍스트 길이: {len(korean_text)} 문자")
+        
+        # 청크별 MP3 바이트를 순서대로 이어 한 번에 저장
+        output_path.write_bytes(b"".join(audio_parts))
+        return str(output_path)
     
-    def process_youtube_video(self, youtube_url: str, output_filename: str = "korean_audio.mp3") -> bool:
-        """전체 파이프라인 실행"""
+    def process_youtube_video(self, youtube_url: str, output_filename: str = "korean_audio.mp3",
+                              output_dir: Optional[str] = None) -> bool:
+        """전체 파이프라인 실행 (output_dir을 주면 기본 출력 디렉토리 대신 사용)"""
         logger.info("=== YouTube → 한국어 음성 변환 시작 ===")
         
-        # 1. 오디오 추출
-        audio_file = self.extract_audio(youtube_url)
-        if not audio_file:
-            return False
+        output_dir = Path(output_dir) if output_dir else self.output_dir
+        output_dir.mkdir(parents=True, exist_ok=True)
         
-        # 2. 음성 인식
-        english_text = self.transcribe_audio(audio_file)
-        if not english_text:
+        # 1. 오디오 추출
+        audio = self.extract_audio(youtube_url)
+        if audio is None:
             return False
         
-        # 3. 번역
-        korean_text = self.translate_text(english_text)
-        if not korean_text:
+        # 2~4. 음성 인식 → 번역 → TTS (청크 단위로 겹쳐서 실행)
+        try:
+            output_file = asyncio.run(self._run_pipeline(audio, output_dir / output_filename))
+        except Exception as e:
+            logger.error(f"변환 파이프라인 실패: {e}")
             return False
-        
-        # 4. TTS
-        output_file = self.text_to_speech(korean_text, output_filename)
         if not output_file:
             return False
         
         logger.info("=== 변환 완료! ===")
         logger.info(f"최종 출력 파일: {output_file}")
         
-        # 임시 오디오 파일 정리
+        return True
+
+class _ConvertRequestHandler(socketserver.StreamRequestHandler):
+    """데몬 요청 처리: JSON 한 줄({"url", "output", "output_dir"})을 받아 결과를 JSON 한 줄로 응답"""
+    
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return  # 요청 없이 연결만 확인하고 닫은 경우
+        
         try:
-            os.remove(audio_file)
-            logger.info("임시 파일 정리 완료")
-        except:
-            pass
+            request = json.loads(line)
+            output_filename = Path(request.get('output') or 'korean_audio.mp3').name
+            converter = self.server.converter
+            output_dir = Path(request.get('output_dir') or converter.output_dir)
+            success = converter.process_youtube_video(request['url'], output_filename, output_dir)
+            response = {
+                'success': success,
+                'output_file': str((output_dir / output_filename).resolve()),
+            }
+        except Exception as e:
+            logger.error(f"데몬 요청 처리 실패: {e}")
+            response = {'success': False, 'error': str(e)}
         
-        return True
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+def _connect_daemon(socket_path: str) -> Optional[socket.socket]:
+    """데몬 소켓에 연결 (응답하는 데몬이 없으면 None)"""
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+    
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+def serve(converter: YouTube2Korean, socket_path: str) -> bool:
+    """모델을 한 번만 로드한 상태로 유닉스 소켓에서 변환 요청을 순서대로 처리"""
+    if os.path.exists(socket_path):
+        sock = _connect_daemon(socket_path)
+        if sock is not None:
+            sock.close()
+            logger.error(f"이미 실행 중인 데몬이 있습니다: {socket_path}")
+            return False
+        os.remove(socket_path)  # 응답이 없는 이전 실행의 소켓 파일 정리
+    
+    with socketserver.UnixStreamServer(socket_path, _ConvertRequestHandler) as server:
+        server.converter = converter
+        logger.info(f"데몬 대기 중: {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("데몬 종료")
+        finally:
+            os.remove(socket_path)
+    return True
+
+def forward_to_daemon(socket_path: str, youtube_url: str, output_filename: str,
+                      output_dir: str) -> Optional[bool]:
+    """실행 중인 데몬에 변환 요청 전달 (데몬이 없으면 None)"""
+    sock = _connect_daemon(socket_path)
+    if sock is None:
+        return None
+    
+    logger.info(f"실행 중인 데몬에 요청 전달: {socket_path}")
+    with sock, sock.makefile('rwb') as stream:
+        # 데몬의 작업 디렉토리와 다를 수 있으므로 출력 디렉토리는 절대 경로로 전달
+        request = {'url': youtube_url, 'output': output_filename,
+                   'output_dir': str(Path(output_dir).resolve())}
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        response = json.loads(stream.readline() or b'{}')
+    
+    if response.get('output_file'):
+        logger.info(f"최종 출력 파일: {response['output_file']}")
+    return bool(response.get('success'))
 
 def main():
     parser = argparse.ArgumentParser(description='YouTube 영상을 한국어 음성으로 변환')
-    parser.add_argument('url', help='YouTube URL')
+    parser.add_argument('url', nargs='?', help='YouTube URL')
     parser.add_argument('-o', '--output', default='korean_audio.mp3', 
                        help='출력 파일명 (기본값: korean_audio.mp3)')
     parser.add_argument('--output-dir', default='output',
                        help='출력 디렉토리 (기본값: output)')
+    parser.add_argument('--batch-size', type=int, default=16,
+                       help='Whisper 배치 크기, 메모리가 부족하면 줄이세요 (기본값: 16)')
+    parser.add_argument('--max-concurrent', type=int, default=4,
+                       help='동시 번역 요청 수, OLLAMA_NUM_PARALLEL과 맞추세요 (기본값: 4)')
+    parser.add_argument('--quality', choices=sorted(OLLAMA_MODELS), default='fast',
+                       help='번역 모델 품질: fast=Q4_K_M, accurate=Q8_0 (기본값: fast)')
+    parser.add_argument('--piper-voice',
+                       help='Piper 한국어 음성 모델(.onnx) 경로, 지정하면 gTTS 대신 로컬 TTS 사용')
+    parser.add_argument('--device', choices=['auto', 'cpu', 'cuda'], default='auto',
+                       help='Whisper 실행 장치: cuda=GPU FP16, cpu=int8 (기본값: auto)')
+    parser.add_argument('--llama-server',
+                       help='Ollama 대신 사용할 llama.cpp 서버 주소 (예: http://localhost:8080)')
+    parser.add_argument('--serve', action='store_true',
+                       help='모델을 한 번만 로드하고 데몬으로 실행하며 변환 요청을 받음')
+    parser.add_argument('--socket', default=os.path.join(tempfile.gettempdir(), 'youtube2korean.sock'),
+                       help='데몬 유닉스 소켓 경로 (기본값: 임시 디렉토리/youtube2korean.sock)')
     
     args = parser.parse_args()
     
-    if not args.url:
+    if not args.serve and not args.url:
         print("YouTube URL을 입력해주세요.")
         sys.exit(1)
     
-    # 변환기 초기화 및 실행
-    converter = YouTube2Korean(output_dir=args.output_dir)
-    success = converter.process_youtube_video(args.url, args.output)
+    if args.serve:
+        # 모델을 로드하기 전에 이미 실행 중인 데몬이 있는지 확인
+        sock = _connect_daemon(args.socket)
+        if sock is not None:
+            sock.close()
+            print(f"이미 실행 중인 데몬이 있습니다: {args.socket}")
+            sys.exit(1)
+    
+    # 데몬이 실행 중이면 요청만 전달 (모델 로딩 생략)
+    success = None
+    if not args.serve:
+        success = forward_to_daemon(args.socket, args.url, args.output, args.output_dir)
+    
+    if success is None:
+        # 변환기 초기화 및 실행
+        converter = YouTube2Korean(output_dir=args.output_dir, batch_size=args.batch_size,
+                                   max_concurrent=args.max_concurrent, quality=args.quality,
+                                   piper_voice=args.piper_voice, device=args.device,
+                                   llama_server=args.llama_server)
+        if args.serve:
+            if not serve(converter, args.socket):
+                sys.exit(1)
+            return
+        success = converter.process_youtube_video(args.url, args.output)
     
     if success:
         print("✅ 변환이 성공적으로 완료되었습니다!")